@@ -21,6 +21,7 @@ DEPENDENCIES = [
     'opencv-python==4.8.1.78',
     'basicsr==1.4.2',
     'realesrgan==0.3.0',
+    'safetensors==0.4.0',
 ]
 
 # Stable PyTorch pairing (locked version)
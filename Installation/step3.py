@@ -8,6 +8,11 @@ import sys
 import urllib.request
 import json
 
+# The checkpoint conversion lives in Project/backend.py (importing it is cheap,
+# the ML stack is only loaded on demand)
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Project')
+sys.path.insert(0, PROJECT_DIR)
+
 # Model configuration
 MODEL_INFO = {
     'name': 'RealESRGAN_x4plus',
@@ -46,6 +51,26 @@ def download_file(url, destination, filename):
         print(f"\n  ERROR downloading {filename}: {e}")
         return False
 
+def convert_to_safetensors(pth_path):
+    """Convert a .pth checkpoint into a memory-mappable .safetensors file
+    
+    Uses the backend's own conversion so the installer and the runtime
+    fallback always produce identical files and checksums.
+    
+    Returns:
+        (filename, sha256) of the converted file, or None on failure
+    """
+    try:
+        from backend import import_ml_stack, convert_checkpoint
+        
+        import_ml_stack()
+        return convert_checkpoint(pth_path)
+        
+    except Exception as e:
+        print(f"  WARNING: Could not convert {os.path.basename(pth_path)}: {e}")
+        print(f"  The backend will convert it on first use instead.")
+        return None
+
 def setup_model(models_path):
     """Download and setup AI model"""
     
@@ -92,6 +117,19 @@ def setup_model(models_path):
             print(f"  ✗ x2 Model download failed")
     print()
     
+    # Convert checkpoints to safetensors for fast, memory-mapped loading
+    converted = {}
+    for key, filepath, success in (('ultra_realistic', filepath_x4, success_x4),
+                                   ('x2', filepath_x2, success_x2)):
+        if not success:
+            continue
+        print(f"Converting {os.path.basename(filepath)} to safetensors...")
+        result = convert_to_safetensors(filepath)
+        if result:
+            converted[key] = result
+            print(f"  ✓ Saved {result[0]}")
+    print()
+    
     # Create model configuration file
     config = {
         'models_path': models_path,
@@ -108,6 +146,10 @@ def setup_model(models_path):
         }
     }
     
+    for key, (weights_file, sha256) in converted.items():
+        config['presets'][key]['weights_file'] = weights_file
+        config['presets'][key]['weights_sha256'] = sha256
+    
     # Save config to Project folder
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_dir = os.path.join(os.path.dirname(script_dir), 'Project')
@@ -4,35 +4,352 @@ Handles image upload, processing, and serving the web UI
 """
 
 import os
+import re
 import sys
 import json
+import time
+import hashlib
+import math
+import shutil
+import tempfile
+import itertools
 import webbrowser
-from threading import Timer
+from threading import Timer, Condition, Lock, Event, Thread
 from flask import Flask, request, jsonify, send_from_directory, send_file
 from werkzeug.utils import secure_filename
-from PIL import Image
-import numpy as np
-import cv2
-import torch
-from basicsr.archs.rrdbnet_arch import RRDBNet
-from realesrgan import RealESRGANer
+
+# Startup timing starts here; everything above is the light web stack
+STARTUP_TIME = time.perf_counter()
+
+# Heavy ML modules, bound by import_ml_stack() so the server starts instantly
+np = None
+cv2 = None
+torch = None
+RRDBNet = None
+RealESRGANer = None
+load_safetensors = None  # Stays None without safetensors: .pth checkpoints are used
+save_safetensors = None
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'outputs'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'bmp'}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+UPLOAD_CHUNK_SIZE = 2 * 1024 * 1024  # 2MB per chunk for resumable uploads
+UPLOAD_MAX_AGE = 24 * 3600  # Chunked uploads are removed a day after their last use
+UPLOAD_CLEANUP_INTERVAL = 3600  # Seconds between expiry sweeps of chunked uploads
+
+# Deep-zoom output
+PYRAMID_FOLDER = os.path.join(OUTPUT_FOLDER, 'pyramids')
+PYRAMID_TILE_SIZE = 256
+PYRAMID_JPEG_QUALITY = 90
+PYRAMID_CACHE_MAX_AGE = 7 * 24 * 3600  # Pyramid ids include the input hash, tiles never change
 SCALE_FACTORS = [2, 4]  # Available scaling multipliers (changed to only 2x, 4x)
 PRESET = 'ultra_realistic'  # Fixed preset - realistic upscaling only
 
+# Scheduling
+MODEL_LANES = {4: 'ultra_realistic', 2: 'x2'}  # Model scale -> preset / scheduler lane
+# Concurrent jobs per model. Parallel forwards on one model mostly compete for
+# the same cores / VRAM, so 1 per lane keeps latency predictable.
+LANE_CONCURRENCY = {'ultra_realistic': 1, 'x2': 1}
+AGING_RATE = 0.5  # Cost units (megapixels x scale) a waiting job gains per second
+
+# Checkpointing of large jobs
+SCRATCH_FOLDER = 'scratch'
+CHECKPOINT_MIN_MEGAPIXELS = 16  # Output size from which tiles are persisted to disk
+SCRATCH_MAX_AGE = 7 * 24 * 3600  # Abandoned checkpoints are removed after a week
+
 # Create Flask app
 app = Flask(__name__, static_folder='web', static_url_path='')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+# ML stack import state
+ml_ready = Event()
+ml_import_lock = Lock()
+startup_profile = {'imports': {}, 'error': None}
+
+def import_ml_stack():
+    """Import the heavy ML modules on first use
+    
+    Safe to call from any thread; only the first call does the work, later
+    calls block until it is done. Import times are recorded in
+    startup_profile so startup regressions show up in the report.
+    """
+    global np, cv2, torch, RRDBNet, RealESRGANer, load_safetensors, save_safetensors
+    
+    if ml_ready.is_set():
+        return
+    
+    with ml_import_lock:
+        if ml_ready.is_set():
+            return
+        
+        timings = startup_profile['imports']
+        
+        def timed(name, loader):
+            start = time.perf_counter()
+            module = loader()
+            timings[name] = round(time.perf_counter() - start, 3)
+            return module
+        
+        try:
+            np = timed('numpy', lambda: __import__('numpy'))
+            cv2 = timed('cv2', lambda: __import__('cv2'))
+            torch = timed('torch', lambda: __import__('torch'))
+            RRDBNet = timed('basicsr', lambda: __import__('basicsr.archs.rrdbnet_arch', fromlist=['RRDBNet']).RRDBNet)
+            RealESRGANer = timed('realesrgan', lambda: __import__('realesrgan', fromlist=['RealESRGANer']).RealESRGANer)
+            try:
+                st = timed('safetensors', lambda: __import__('safetensors.torch', fromlist=['load_file']))
+                load_safetensors, save_safetensors = st.load_file, st.save_file
+            except ImportError:
+                pass
+        except Exception as e:
+            startup_profile['error'] = str(e)
+            raise
+        
+        startup_profile['ml_ready_after'] = round(time.perf_counter() - STARTUP_TIME, 3)
+        ml_ready.set()
+
+def print_startup_report():
+    """Print how long each heavy import took"""
+    print("\nStartup profile:")
+    for name, seconds in sorted(startup_profile['imports'].items(), key=lambda item: -item[1]):
+        print(f"  {name:<12} {seconds:6.3f}s")
+    print(f"  ML stack ready {startup_profile.get('ml_ready_after', 0):.3f}s after start")
+    print(f"  Device: {'CUDA (GPU)' if torch.cuda.is_available() else 'CPU'}\n")
+
+def warm_up():
+    """Background thread: import the ML stack and load the default model"""
+    try:
+        import_ml_stack()
+        print_startup_report()
+        config = load_models_config()
+        if config:
+            start = time.perf_counter()
+            initialize_upscaler(config)
+            startup_profile['model_warm'] = round(time.perf_counter() - start, 3)
+    except Exception as e:
+        print(f"ERROR during warm-up: {e}")
+
 # Global upscaler cache
 upscalers = {}
+# One build lock per model: loading one model must not stall the other lane
+upscaler_build_locks = {cache_key: Lock() for cache_key in MODEL_LANES.values()}
+models_config_lock = Lock()  # Serializes read-modify-write of models_config.json
+
+class UpscaleScheduler:
+    """Shortest-job-first scheduler for model inference
+    
+    Pending jobs are grouped into lanes (one per model) and each lane runs at
+    most its configured number of jobs at once. When a slot frees up, the
+    cheapest pending job runs next. A job's cost is reduced by AGING_RATE for
+    every second it has waited, so large images are not starved.
+    """
+    
+    def __init__(self, lane_limits, aging_rate):
+        self.lane_limits = dict(lane_limits)
+        self.aging_rate = aging_rate
+        self._cond = Condition()
+        self._pending = {lane: [] for lane in self.lane_limits}
+        self._running = {lane: 0 for lane in self.lane_limits}
+        self._counter = itertools.count()
+    
+    def _priority(self, job, now):
+        return (job['cost'] - self.aging_rate * (now - job['submitted']), job['seq'])
+    
+    def _is_next(self, lane, job):
+        if self._running[lane] >= self.lane_limits.get(lane, 1):
+            return False
+        now = time.monotonic()
+        return min(self._pending[lane], key=lambda j: self._priority(j, now)) is job
+    
+    def run(self, lane, cost, func, *args, **kwargs):
+        """Block until the job is scheduled, then run it on the calling thread
+        
+        Args:
+            lane: Lane name (model cache key)
+            cost: Estimated job cost, lower runs first
+            func: Callable doing the actual work
+        
+        Returns:
+            Whatever func returns
+        """
+        job = {'cost': cost, 'submitted': time.monotonic(), 'seq': next(self._counter)}
+        
+        with self._cond:
+            self._pending.setdefault(lane, [])
+            self._running.setdefault(lane, 0)
+            self._pending[lane].append(job)
+            while not self._is_next(lane, job):
+                self._cond.wait()
+            self._pending[lane].remove(job)
+            self._running[lane] += 1
+            # Other slots in this lane may still be free
+            self._cond.notify_all()
+        
+        waited = time.monotonic() - job['submitted']
+        if waited >= 1:
+            print(f"Job (cost {cost:.2f}) waited {waited:.1f}s in '{lane}' queue")
+        
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._cond:
+                self._running[lane] -= 1
+                self._cond.notify_all()
+    
+    def status(self):
+        """Snapshot of pending and running job counts per lane"""
+        with self._cond:
+            return {
+                lane: {'pending': len(self._pending[lane]), 'running': self._running[lane]}
+                for lane in self._pending
+            }
+
+scheduler = UpscaleScheduler(LANE_CONCURRENCY, AGING_RATE)
+
+class SingleFlight:
+    """Coalesce identical concurrent calls into a single execution
+    
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait and receive the same result (or exception).
+    """
+    
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = {}
+    
+    def do(self, key, func):
+        """Run func once per key among concurrent callers
+        
+        Returns:
+            (result, shared) where shared is True if another caller's
+            computation was reused
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+        
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result'], True
+        
+        try:
+            call['result'] = func()
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+        
+        return call['result'], False
+
+inflight = SingleFlight()
+pyramid_flights = SingleFlight()  # One build per pyramid, whichever requests ask for it
+
+# Chunked uploads
+uploads_lock = Lock()
+last_upload_cleanup = 0.0
+
+def upload_paths(upload_id):
+    """Paths of the data and metadata files of a chunked upload"""
+    chunks_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'chunks')
+    return os.path.join(chunks_dir, f"{upload_id}.part"), os.path.join(chunks_dir, f"{upload_id}.json")
+
+def load_upload_meta(upload_id):
+    """Load metadata of a chunked upload, or None if it does not exist"""
+    if not re.fullmatch(r'[0-9a-f]{64}', upload_id or ''):
+        return None
+    try:
+        with open(upload_paths(upload_id)[1], 'r') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def save_upload_meta(upload_id, meta):
+    """Write metadata of a chunked upload"""
+    meta_path = upload_paths(upload_id)[1]
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+
+def read_upload(upload_id):
+    """Read a fully received chunked upload
+    
+    Finished uploads are kept until cleanup_uploads expires them: the id is
+    the file's hash, so users sending the same file share the upload and a
+    duplicate request finds it already complete instead of re-sending it.
+    
+    Returns:
+        File contents, or None if the upload does not exist (anymore)
+    """
+    part_path, meta_path = upload_paths(upload_id)
+    
+    with uploads_lock:
+        meta = load_upload_meta(upload_id)
+        if not meta:
+            return None
+        if len(meta['received']) != meta['chunks']:
+            raise ValueError(f"Upload incomplete ({len(meta['received'])}/{meta['chunks']} chunks)")
+        
+        try:
+            with open(part_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        
+        # The upload id is the SHA-256 of the file, computed by the client
+        if hashlib.sha256(data).hexdigest() != upload_id:
+            for path in (part_path, meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise ValueError("Upload checksum mismatch, please upload again")
+        
+        # Each use extends the upload's lifetime
+        os.utime(meta_path)
+    
+    return data
+
+def cleanup_uploads():
+    """Remove chunked uploads not used for UPLOAD_MAX_AGE
+    
+    The metadata file's mtime is the last use; the data file goes with it.
+    """
+    global last_upload_cleanup
+    
+    chunks_dir = os.path.join(UPLOAD_FOLDER, 'chunks')
+    last_upload_cleanup = time.time()
+    if not os.path.isdir(chunks_dir):
+        return
+    
+    with uploads_lock:
+        now = time.time()
+        for name in os.listdir(chunks_dir):
+            upload_id, ext = os.path.splitext(name)
+            if ext != '.json':
+                continue
+            part_path, meta_path = upload_paths(upload_id)
+            if now - os.path.getmtime(meta_path) > UPLOAD_MAX_AGE:
+                for path in (part_path, meta_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+        
+        # Data files whose metadata is gone
+        for name in os.listdir(chunks_dir):
+            path = os.path.join(chunks_dir, name)
+            upload_id, ext = os.path.splitext(name)
+            if ext == '.part' and not os.path.exists(upload_paths(upload_id)[1]) \
+                    and now - os.path.getmtime(path) > UPLOAD_MAX_AGE:
+                os.remove(path)
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -47,44 +364,430 @@ def load_models_config():
         print(f"ERROR loading models configuration: {e}")
         return None
 
+def update_preset_config(cache_key, updates):
+    """Merge updates into one preset of models_config.json
+    
+    The file is re-read under models_config_lock so concurrent updates of
+    different presets don't overwrite each other with a stale copy.
+    """
+    with models_config_lock:
+        with open('models_config.json', 'r') as f:
+            config = json.load(f)
+        config['presets'][cache_key].update(updates)
+        
+        tmp_path = 'models_config.json.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_path, 'models_config.json')
+
+def file_sha256(filepath):
+    """Compute the SHA-256 checksum of a file"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def convert_checkpoint(pth_path):
+    """Convert a .pth checkpoint to safetensors next to the original
+    
+    Shared by Installation/step3.py and the runtime fallback in
+    resolve_weights, so both produce the same file and checksum.
+    
+    Returns:
+        (filename, sha256) of the converted file
+    """
+    import_ml_stack()
+    if save_safetensors is None:
+        raise ImportError("safetensors is not installed")
+    
+    out_path = os.path.splitext(pth_path)[0] + '.safetensors'
+    loadnet = torch.load(pth_path, map_location='cpu')
+    keyname = 'params_ema' if 'params_ema' in loadnet else 'params'
+    state_dict = {k: v.contiguous() for k, v in loadnet[keyname].items()}
+    
+    tmp_path = out_path + '.tmp'
+    save_safetensors(state_dict, tmp_path, metadata={'source': os.path.basename(pth_path)})
+    os.replace(tmp_path, out_path)
+    return os.path.basename(out_path), file_sha256(out_path)
+
+def resolve_weights(config, cache_key):
+    """Find the safetensors weights for a preset, converting the .pth if needed
+    
+    Installation normally converts the checkpoints (step3). This is the
+    runtime fallback for older installs; the result is recorded in
+    models_config.json so the conversion only happens once.
+    
+    Returns:
+        Path to a verified .safetensors file, or None to use the .pth
+    """
+    if load_safetensors is None:
+        return None
+    
+    preset_config = config['presets'][cache_key]
+    weights_file = preset_config.get('weights_file')
+    weights_path = os.path.join(config['models_path'], weights_file) if weights_file else None
+    
+    if weights_path and os.path.exists(weights_path):
+        expected = preset_config.get('weights_sha256')
+        if expected is None or file_sha256(weights_path) == expected:
+            return weights_path
+        print(f"WARNING: Checksum mismatch for {weights_file}, converting again")
+    
+    pth_path = os.path.join(config['models_path'], preset_config['model_file'])
+    try:
+        print(f"Converting {preset_config['model_file']} to safetensors...")
+        weights_file, sha256 = convert_checkpoint(pth_path)
+    except Exception as e:
+        print(f"WARNING: Could not convert {preset_config['model_file']}: {e}")
+        return None
+    
+    preset_config['weights_file'] = weights_file
+    preset_config['weights_sha256'] = sha256
+    try:
+        update_preset_config(cache_key, {'weights_file': weights_file, 'weights_sha256': sha256})
+    except Exception as e:
+        print(f"WARNING: Could not update models configuration: {e}")
+    
+    return os.path.join(config['models_path'], weights_file)
+
+def load_mapped_upscaler(scale, weights_path, model, tile=0, tile_pad=10, pre_pad=10, half=False, device=None):
+    """Build a RealESRGANer whose weights come from a safetensors file
+    
+    The state dict is memory-mapped and assigned to the model without a copy,
+    so on CPU the weights stay in the page cache and are shared by every
+    worker process instead of each holding a private unpickled copy.
+    RealESRGANer.__init__ is skipped because it always torch.loads a .pth.
+    """
+    upscaler = RealESRGANer.__new__(RealESRGANer)
+    upscaler.scale = scale
+    upscaler.tile_size = tile
+    upscaler.tile_pad = tile_pad
+    upscaler.pre_pad = pre_pad
+    upscaler.mod_scale = None
+    upscaler.half = half
+    upscaler.device = torch.device(device) if device else torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    
+    state_dict = load_safetensors(weights_path, device='cpu')
+    model.load_state_dict(state_dict, strict=True, assign=True)
+    model.eval()
+    upscaler.model = model.to(upscaler.device)
+    if half:
+        upscaler.model = upscaler.model.half()
+    return upscaler
+
 def initialize_upscaler(config, scale=4):
-    if scale == 4:
-        cache_key = 'ultra_realistic'
-        preset_config = config['presets'][cache_key]
-        model_path = os.path.join(config['models_path'], preset_config['model_file'])
-        netscale = 4
-    elif scale == 2:
-        cache_key = 'x2'
-        preset_config = config['presets'][cache_key]
-        model_path = os.path.join(config['models_path'], preset_config['model_file'])
-        netscale = 2
-    else:
+    if scale not in MODEL_LANES:
         raise ValueError(f"Unsupported scale factor: {scale}")
 
-    if cache_key in upscalers:
-        return upscalers[cache_key]
+    import_ml_stack()
+    cache_key = MODEL_LANES[scale]
+    preset_config = config['presets'][cache_key]
+    model_path = os.path.join(config['models_path'], preset_config['model_file'])
+    netscale = scale
+
+    # Cache hits need no lock (dict reads are atomic under the GIL)
+    upscaler = upscalers.get(cache_key)
+    if upscaler is not None:
+        return upscaler
 
+    with upscaler_build_locks[cache_key]:
+        # Another request may have built it while we waited
+        if cache_key in upscalers:
+            return upscalers[cache_key]
+        return _create_upscaler(config, cache_key, model_path, netscale)
+
+def _create_upscaler(config, cache_key, model_path, netscale):
+    """Build a RealESRGANer and store it in the cache (caller holds its build lock)"""
     model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=netscale)
     
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
     half = torch.cuda.is_available()
     tile = 400 if device == 'cuda' else 200
 
-    upscaler = RealESRGANer(
-        scale=netscale,
-        model_path=model_path,
-        model=model,
-        tile=tile,
-        tile_pad=10,
-        pre_pad=0,
-        half=half,
-        device=device
-    )
+    start = time.perf_counter()
+    weights_path = resolve_weights(config, cache_key)
+    if weights_path:
+        upscaler = load_mapped_upscaler(
+            scale=netscale,
+            weights_path=weights_path,
+            model=model,
+            tile=tile,
+            tile_pad=10,
+            pre_pad=0,
+            half=half,
+            device=device
+        )
+    else:
+        upscaler = RealESRGANer(
+            scale=netscale,
+            model_path=model_path,
+            model=model,
+            tile=tile,
+            tile_pad=10,
+            pre_pad=0,
+            half=half,
+            device=device
+        )
+    print(f"Loaded {os.path.basename(weights_path or model_path)} in {time.perf_counter() - start:.2f}s")
+    prepare_model(upscaler)
 
     upscalers[cache_key] = upscaler
     print(f"✓ Initialized upscaler on {device.upper()}")
     return upscaler
 
+def prepare_model(upscaler):
+    """Adapt the model to the BGR uint8 tile path of enhance_image
+    
+    The BGR <-> RGB swaps are folded into conv_first and conv_last so images
+    go through the network without being reordered. Only those two small
+    layers get new weights; the rest stays shared with the mmap'd file.
+    On CUDA the model also switches to channels_last.
+    """
+    model = upscaler.model
+    
+    # conv_first sees 3 channels (x4) or 3 pixel-unshuffled groups (x2)
+    group = model.conv_first.weight.shape[1] // 3
+    in_order = [c * group + k for c in (2, 1, 0) for k in range(group)]
+    out_order = [2, 1, 0]
+    
+    with torch.no_grad():
+        model.conv_first.weight = torch.nn.Parameter(model.conv_first.weight[:, in_order].clone(), requires_grad=False)
+        model.conv_last.weight = torch.nn.Parameter(model.conv_last.weight[out_order].clone(), requires_grad=False)
+        model.conv_last.bias = torch.nn.Parameter(model.conv_last.bias[out_order].clone(), requires_grad=False)
+    
+    if upscaler.device.type == 'cuda':
+        upscaler.model = model.to(memory_format=torch.channels_last)
+
+def estimate_job_cost(img, scale):
+    """Estimate inference cost of an image as megapixels x scale"""
+    height, width = img.shape[:2]
+    return (width * height / 1_000_000) * scale
+
+def enhance_scheduled(upscaler, img, netscale, outscale):
+    """Run enhance_image through the scheduler lane of its model
+    
+    Args:
+        upscaler: Initialized RealESRGANer
+        img: Input image (BGR numpy array)
+        netscale: Native scale of the model (selects the lane)
+        outscale: Requested output scale
+    
+    Returns:
+        Upscaled image as numpy array
+    """
+    cost = estimate_job_cost(img, netscale)
+    lane = MODEL_LANES[netscale]
+    
+    height, width = img.shape[:2]
+    checkpoint = width * height * netscale * netscale / 1_000_000 >= CHECKPOINT_MIN_MEGAPIXELS
+    return scheduler.run(lane, cost, enhance_image, upscaler, img, netscale, outscale, checkpoint)
+
+def checkpoint_key(img, netscale, outscale, upscaler):
+    """Identify a job by input pixels and every setting that affects its tiles"""
+    digest = hashlib.sha256(np.ascontiguousarray(img).data)
+    settings = f"{MODEL_LANES[netscale]}|{outscale}|{upscaler.tile_size}|{upscaler.tile_pad}|{upscaler.half}"
+    digest.update(settings.encode())
+    return digest.hexdigest()[:32]
+
+def open_checkpoint(job_dir, meta):
+    """Open (or create) the scratch store of a job
+    
+    The store is a memmap holding the full uint8 output plus a one byte per
+    tile completion bitmap. A store whose metadata does not match is reset.
+    
+    Returns:
+        (output memmap, bitmap memmap)
+    """
+    meta_path = os.path.join(job_dir, 'meta.json')
+    output_path = os.path.join(job_dir, 'output.dat')
+    bitmap_path = os.path.join(job_dir, 'tiles.dat')
+    
+    try:
+        with open(meta_path, 'r') as f:
+            resumable = json.load(f) == meta
+    except Exception:
+        resumable = False
+    
+    if not resumable:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        os.makedirs(job_dir, exist_ok=True)
+        np.memmap(output_path, dtype=np.uint8, mode='w+', shape=tuple(meta['output_shape'])).flush()
+        np.memmap(bitmap_path, dtype=np.uint8, mode='w+', shape=(meta['tiles'],)).flush()
+        # Metadata goes last: a store without it is never resumed
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+    
+    output = np.memmap(output_path, dtype=np.uint8, mode='r+', shape=tuple(meta['output_shape']))
+    bitmap = np.memmap(bitmap_path, dtype=np.uint8, mode='r+', shape=(meta['tiles'],))
+    return output, bitmap
+
+def enhance_image(upscaler, img, netscale, outscale, checkpoint=False):
+    """Tile-based replacement for RealESRGANer.enhance
+    
+    Tiles go into the network as BGR uint8 views of the input (prepare_model
+    folded the channel swap into the model) and come back as uint8 written
+    straight into one preallocated output, so no full-size float copy of the
+    image is ever made. With checkpoint=True the output is a memmap in
+    SCRATCH_FOLDER and finished tiles are marked in a bitmap; running the
+    same job again (same pixels and settings) only processes the missing
+    tiles.
+    
+    Args:
+        upscaler: Initialized RealESRGANer (after prepare_model)
+        img: Input image (BGR uint8 numpy array)
+        netscale: Native scale of the model
+        outscale: Requested output scale
+        checkpoint: Persist tiles so the job survives restarts
+    
+    Returns:
+        Upscaled image as numpy array
+    """
+    h_input, w_input = img.shape[:2]
+    
+    # Same reflect padding RealESRGANer applies for the x2 model
+    mod_scale = 2 if netscale == 2 else None
+    if mod_scale:
+        pad_h = (mod_scale - h_input % mod_scale) % mod_scale
+        pad_w = (mod_scale - w_input % mod_scale) % mod_scale
+        if pad_h or pad_w:
+            img = cv2.copyMakeBorder(img, 0, pad_h, 0, pad_w, cv2.BORDER_REFLECT_101)
+    
+    height, width = img.shape[:2]
+    tile_size = upscaler.tile_size or max(height, width)
+    tile_pad = upscaler.tile_pad
+    tiles_x = math.ceil(width / tile_size)
+    tiles_y = math.ceil(height / tile_size)
+    output_shape = (height * netscale, width * netscale, 3)
+    
+    if checkpoint:
+        key = checkpoint_key(img, netscale, outscale, upscaler)
+        job_dir = os.path.join(SCRATCH_FOLDER, key)
+        meta = {
+            'output_shape': list(output_shape),
+            'tiles': tiles_x * tiles_y,
+            'tile_size': tile_size
+        }
+        output, bitmap = open_checkpoint(job_dir, meta)
+        
+        done = int(bitmap.sum())
+        if done:
+            print(f"Resuming checkpoint {key}: {done}/{meta['tiles']} tiles already done")
+    else:
+        output = np.empty(output_shape, dtype=np.uint8)
+        bitmap = None
+    
+    dtype = torch.float16 if upscaler.half else torch.float32
+    
+    with torch.inference_mode():
+        for y in range(tiles_y):
+            for x in range(tiles_x):
+                index = y * tiles_x + x
+                if bitmap is not None and bitmap[index]:
+                    continue
+                
+                start_x = x * tile_size
+                end_x = min(start_x + tile_size, width)
+                start_y = y * tile_size
+                end_y = min(start_y + tile_size, height)
+                start_x_pad = max(start_x - tile_pad, 0)
+                end_x_pad = min(end_x + tile_pad, width)
+                start_y_pad = max(start_y - tile_pad, 0)
+                end_y_pad = min(end_y + tile_pad, height)
+                
+                # HWC uint8 viewed as NCHW is already channels_last
+                tile = torch.from_numpy(img[start_y_pad:end_y_pad, start_x_pad:end_x_pad])
+                tile = tile.to(upscaler.device).permute(2, 0, 1).unsqueeze(0)
+                tile = tile.to(dtype).div_(255.0)
+                
+                result = upscaler.model(tile)
+                
+                crop_y = (start_y - start_y_pad) * netscale
+                crop_x = (start_x - start_x_pad) * netscale
+                result = result[0, :, crop_y:crop_y + (end_y - start_y) * netscale,
+                                crop_x:crop_x + (end_x - start_x) * netscale]
+                result = result.float().clamp_(0, 1).mul_(255.0).round_().to(torch.uint8)
+                
+                output[start_y * netscale:end_y * netscale,
+                       start_x * netscale:end_x * netscale] = result.permute(1, 2, 0).cpu().numpy()
+                
+                if bitmap is not None:
+                    # Tile data must reach disk before it is marked done
+                    output.flush()
+                    bitmap[index] = 1
+                    bitmap.flush()
+    
+    if checkpoint:
+        result = np.array(output[:h_input * netscale, :w_input * netscale])
+        del output, bitmap
+        shutil.rmtree(job_dir, ignore_errors=True)
+    elif output.shape[:2] != (h_input * netscale, w_input * netscale):
+        result = np.ascontiguousarray(output[:h_input * netscale, :w_input * netscale])
+    else:
+        result = output
+    
+    if outscale != netscale:
+        result = cv2.resize(result, (int(w_input * outscale), int(h_input * outscale)),
+                            interpolation=cv2.INTER_LANCZOS4)
+    return result
+
+def build_pyramid(img, pyramid_dir):
+    """Cut an image into a Deep Zoom (DZI) tile pyramid
+    
+    Writes pyramid_dir/image.dzi and pyramid_dir/image_files/<level>/<col>_<row>.jpg.
+    The top level is the image itself; every level below is the previous
+    one halved, down to a single pixel.
+    
+    Args:
+        img: Image to cut (BGR numpy array)
+        pyramid_dir: Output directory, replaced if it exists
+    """
+    height, width = img.shape[:2]
+    max_level = math.ceil(math.log2(max(width, height)))
+    
+    tmp_dir = pyramid_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    
+    level_img = img
+    for level in range(max_level, -1, -1):
+        level_dir = os.path.join(tmp_dir, 'image_files', str(level))
+        os.makedirs(level_dir)
+        
+        level_h, level_w = level_img.shape[:2]
+        for row in range(math.ceil(level_h / PYRAMID_TILE_SIZE)):
+            for col in range(math.ceil(level_w / PYRAMID_TILE_SIZE)):
+                tile = level_img[row * PYRAMID_TILE_SIZE:(row + 1) * PYRAMID_TILE_SIZE,
+                                 col * PYRAMID_TILE_SIZE:(col + 1) * PYRAMID_TILE_SIZE]
+                cv2.imwrite(os.path.join(level_dir, f"{col}_{row}.jpg"), tile,
+                            [cv2.IMWRITE_JPEG_QUALITY, PYRAMID_JPEG_QUALITY])
+        
+        if level > 0:
+            # ceil keeps every level at ceil(full size / 2^n) as DZI expects
+            level_img = cv2.resize(level_img, (math.ceil(level_w / 2), math.ceil(level_h / 2)),
+                                   interpolation=cv2.INTER_AREA)
+    
+    with open(os.path.join(tmp_dir, 'image.dzi'), 'w') as f:
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+            f'Format="jpg" Overlap="0" TileSize="{PYRAMID_TILE_SIZE}">\n'
+            f'  <Size Width="{width}" Height="{height}"/>\n'
+            '</Image>\n'
+        )
+    
+    shutil.rmtree(pyramid_dir, ignore_errors=True)
+    os.rename(tmp_dir, pyramid_dir)
+
+def cleanup_scratch():
+    """Remove checkpoints of jobs that were never resumed"""
+    if not os.path.isdir(SCRATCH_FOLDER):
+        return
+    now = time.time()
+    for name in os.listdir(SCRATCH_FOLDER):
+        job_dir = os.path.join(SCRATCH_FOLDER, name)
+        if now - os.path.getmtime(job_dir) > SCRATCH_MAX_AGE:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
 def upscale_with_factor(image_path, scale_factor, config):
     """Upscale image by a specific factor
     
@@ -119,19 +822,19 @@ def upscale_with_factor(image_path, scale_factor, config):
             upscaler2 = initialize_upscaler(config, scale=2)
             if upscaler2 is None:
                 raise ValueError("Failed to initialize 2x upscaler")
-            output, _ = upscaler2.enhance(img, outscale=2)
+            output = enhance_scheduled(upscaler2, img, 2, outscale=2)
         
         elif scale_factor == 4:
             # Use the existing 4x model (preserve original behavior)
             upscaler4 = initialize_upscaler(config, scale=4)
             if upscaler4 is None:
                 raise ValueError("Failed to initialize 4x upscaler")
-            output, _ = upscaler4.enhance(img, outscale=4)
+            output = enhance_scheduled(upscaler4, img, 4, outscale=4)
         
         else:
             # Shouldn't happen because API validates, but keep fallback similar to original
             upscaler = initialize_upscaler(config)
-            output, _ = upscaler.enhance(img, outscale=scale_factor)
+            output = enhance_scheduled(upscaler, img, 4, outscale=scale_factor)
         
         final_height, final_width = output.shape[:2]
         print(f"Final upscaled size: {final_width}x{final_height}")
@@ -199,27 +902,27 @@ def upscale_to_resolution(image_path, target_width, target_height, config):
         # Upscale using the calculated factor
         if needed_scale == 4:
             # Native 4x upscale
-            output, _ = upscaler.enhance(img, outscale=4)
+            output = enhance_scheduled(upscaler, img, 4, outscale=4)
         elif needed_scale == 2:
             # Try to use 2x model if present (preserve original logic of 4x then downscale)
             try:
                 upscaler2 = initialize_upscaler(config, scale=2)
-                output, _ = upscaler2.enhance(img, outscale=2)
+                output = enhance_scheduled(upscaler2, img, 2, outscale=2)
             except Exception:
                 # Fallback to 4x then downscale if 2x not present
-                output, _ = upscaler.enhance(img, outscale=4)
+                output = enhance_scheduled(upscaler, img, 4, outscale=4)
                 temp_width = original_width * 2
                 temp_height = original_height * 2
                 output = cv2.resize(output, (temp_width, temp_height), interpolation=cv2.INTER_AREA)
         elif needed_scale == 3:
             # Upscale 4x then downscale to 3x
-            output, _ = upscaler.enhance(img, outscale=4)
+            output = enhance_scheduled(upscaler, img, 4, outscale=4)
             temp_width = original_width * 3
             temp_height = original_height * 3
             output = cv2.resize(output, (temp_width, temp_height), interpolation=cv2.INTER_AREA)
         else:
             # For scales >= 5, upscale 4x then resize
-            output, _ = upscaler.enhance(img, outscale=4)
+            output = enhance_scheduled(upscaler, img, 4, outscale=4)
             temp_width = original_width * needed_scale
             temp_height = original_height * needed_scale
             output = cv2.resize(output, (temp_width, temp_height), interpolation=cv2.INTER_CUBIC)
@@ -273,100 +976,328 @@ def get_scale_factors():
     """Get available scale factors"""
     return jsonify({'scale_factors': SCALE_FACTORS})
 
+@app.route('/api/ready')
+def get_ready():
+    """Report startup progress, with the startup profile
+    
+    'ready' means the ML stack is imported and the default model is
+    loaded, so an upscale request will not wait on warm-up.
+    """
+    # No lock: a model being built must not stall the probe, and copying the
+    # keys of a dict is atomic under the GIL
+    models_loaded = sorted(list(upscalers))
+    
+    return jsonify({
+        'ready': ml_ready.is_set() and PRESET in models_loaded,
+        'ml_imported': ml_ready.is_set(),
+        'models_loaded': models_loaded,
+        'uptime': round(time.perf_counter() - STARTUP_TIME, 3),
+        'profile': startup_profile
+    })
+
+@app.route('/api/queue')
+def get_queue():
+    """Get pending and running job counts per model"""
+    return jsonify({'lanes': scheduler.status()})
+
+@app.route('/api/upload', methods=['POST'])
+def start_upload():
+    """Start or resume a chunked upload
+    
+    The client names the upload by the SHA-256 of the file, so starting the
+    same file again resumes it and reports the chunks already received.
+    """
+    info = request.get_json(silent=True) or {}
+    upload_id = str(info.get('upload_id', ''))
+    filename = secure_filename(str(info.get('filename', '')))
+    
+    if not re.fullmatch(r'[0-9a-f]{64}', upload_id):
+        return jsonify({'error': 'Invalid upload id'}), 400
+    
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Allowed: PNG, JPG, JPEG, WEBP, BMP'}), 400
+    
+    try:
+        size = int(info.get('size'))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid file size'}), 400
+    
+    if size <= 0 or size > MAX_FILE_SIZE:
+        return jsonify({'error': 'File too large. Maximum size is 50MB.'}), 400
+    
+    # Finished uploads are kept for reuse, so expire old ones while running
+    if time.time() - last_upload_cleanup > UPLOAD_CLEANUP_INTERVAL:
+        cleanup_uploads()
+    
+    part_path = upload_paths(upload_id)[0]
+    with uploads_lock:
+        meta = load_upload_meta(upload_id)
+        if (not meta or meta['size'] != size or meta['chunk_size'] != UPLOAD_CHUNK_SIZE
+                or not os.path.exists(part_path)):
+            os.makedirs(os.path.dirname(part_path), exist_ok=True)
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+            meta = {
+                'filename': filename,
+                'size': size,
+                'chunk_size': UPLOAD_CHUNK_SIZE,
+                'chunks': (size + UPLOAD_CHUNK_SIZE - 1) // UPLOAD_CHUNK_SIZE,
+                'received': []
+            }
+        save_upload_meta(upload_id, meta)
+    
+    return jsonify({
+        'upload_id': upload_id,
+        'chunk_size': meta['chunk_size'],
+        'chunks': meta['chunks'],
+        'received': meta['received']
+    })
+
+@app.route('/api/upload/<upload_id>/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    """Store one chunk of a chunked upload"""
+    meta = load_upload_meta(upload_id)
+    if not meta:
+        return jsonify({'error': 'Unknown upload'}), 404
+    
+    if index >= meta['chunks']:
+        return jsonify({'error': 'Invalid chunk index'}), 400
+    
+    data = request.get_data()
+    offset = index * meta['chunk_size']
+    if len(data) != min(meta['chunk_size'], meta['size'] - offset):
+        return jsonify({'error': 'Invalid chunk size'}), 400
+    
+    part_path = upload_paths(upload_id)[0]
+    try:
+        with open(part_path, 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+    except FileNotFoundError:
+        # Consumed by an /api/upscale of the same file in the meantime
+        return jsonify({'error': 'Unknown upload'}), 404
+    
+    with uploads_lock:
+        meta = load_upload_meta(upload_id)
+        if not meta:
+            return jsonify({'error': 'Unknown upload'}), 404
+        if index not in meta['received']:
+            meta['received'].append(index)
+            save_upload_meta(upload_id, meta)
+    
+    return jsonify({'received': len(meta['received']), 'chunks': meta['chunks']})
+
 @app.route('/api/upscale', methods=['POST'])
 def upscale():
-    """Handle image upload and upscaling"""
+    """Handle image upload and upscaling
     
-    # Check if file is in request
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
+    The image is either sent as 'file' or referenced by the 'upload_id' of
+    a finished chunked upload.
+    """
     
-    file = request.files['file']
+    upload_id = request.form.get('upload_id')
+    if upload_id:
+        upload_meta = load_upload_meta(upload_id)
+        if not upload_meta:
+            return jsonify({'error': 'Unknown upload'}), 400
+        if len(upload_meta['received']) != upload_meta['chunks']:
+            return jsonify({'error': 'Upload incomplete'}), 400
+        file = None
+        # A shared upload keeps the first uploader's name; prefer the caller's
+        original_filename = request.form.get('filename') or upload_meta['filename']
+    else:
+        # Check if file is in request
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        original_filename = file.filename
     
-    if file.filename == '':
+    if original_filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
-    if not allowed_file(file.filename):
+    if not allowed_file(original_filename):
         return jsonify({'error': 'Invalid file type. Allowed: PNG, JPG, JPEG, WEBP, BMP'}), 400
     
     # Get upscale mode (factor or resolution)
     upscale_mode = request.form.get('mode', 'factor')
     
+    if upscale_mode == 'factor':
+        # Scale factor mode
+        try:
+            scale_factor = int(request.form.get('scale_factor', 2))
+            if scale_factor not in SCALE_FACTORS:
+                return jsonify({'error': f'Invalid scale factor. Must be one of: {SCALE_FACTORS}'}), 400
+        except ValueError:
+            return jsonify({'error': 'Invalid scale factor'}), 400
+        params = {'scale_factor': scale_factor}
+        
+    elif upscale_mode == 'resolution':
+        # Target resolution mode
+        try:
+            target_width = int(request.form.get('target_width'))
+            target_height = int(request.form.get('target_height'))
+            
+            if target_width <= 0 or target_height <= 0:
+                return jsonify({'error': 'Invalid target resolution'}), 400
+            
+            if target_width > 20000 or target_height > 20000:
+                return jsonify({'error': 'Target resolution too large (max 20000px)'}), 400
+                
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid target resolution'}), 400
+        params = {'target_width': target_width, 'target_height': target_height}
+        
+    else:
+        return jsonify({'error': 'Invalid upscale mode'}), 400
+    
+    # Optional deep-zoom tile pyramid for viewing the result without downloading it.
+    # Not part of params: requests with and without it share one computation.
+    want_pyramid = request.form.get('pyramid') == '1'
+    
     # Load configuration
     config = load_models_config()
     if not config:
         return jsonify({'error': 'Failed to load configuration'}), 500
     
+    if upload_id:
+        try:
+            data = read_upload(upload_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if data is None:
+            return jsonify({'error': 'Unknown upload'}), 400
+    else:
+        data = file.read()
+    
     try:
-        # Save uploaded file
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        filename = secure_filename(file.filename)
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(input_path)
+        filename = secure_filename(original_filename)
         
+        # Identical uploads with identical settings share one computation
+        key = hashlib.sha256(data).hexdigest()
+        flight_key = f"{key}|{upscale_mode}|{json.dumps(params, sort_keys=True)}"
+        
+        result, shared = inflight.do(
+            flight_key,
+            lambda: process_upload(data, key, filename, upscale_mode, params, config)
+        )
+        if shared:
+            print(f"Coalesced duplicate request for {filename}")
+        
+        output = result['_output']
+        response = {k: v for k, v in result.items() if not k.startswith('_')}
+        
+        if want_pyramid:
+            # Answer as soon as the pyramid exists; the full file keeps encoding
+            pyramid_id = os.path.splitext(result['output_file'])[0]
+            pyramid_flights.do(pyramid_id, lambda: ensure_pyramid(output['image'], pyramid_id))
+            response['pyramid'] = pyramid_id
+            response['output_ready'] = not output['writer'].is_alive()
+        else:
+            output['writer'].join()
+            if output['error'] is not None:
+                raise output['error']
+            response['output_ready'] = True
+        
+        return jsonify(dict(response, coalesced=shared))
+        
+    except Exception as e:
+        print(f"ERROR processing image: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+def process_upload(data, key, filename, upscale_mode, params, config):
+    """Save an upload, upscale it and write the output file
+    
+    Args:
+        data: Uploaded file contents
+        key: SHA-256 of data
+        filename: Sanitized original filename
+        upscale_mode: 'factor' or 'resolution'
+        params: Validated mode parameters
+        config: Models configuration
+    
+    Returns:
+        Response fields for /api/upscale
+    """
+    # Blocks only if the warm-up thread has not finished yet
+    import_ml_stack()
+    
+    # Save uploaded file; every call gets its own path, since concurrent
+    # requests for the same file with different settings must not share it
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    fd, input_path = tempfile.mkstemp(prefix=f"{key[:16]}_", suffix=f"_{filename}",
+                                      dir=app.config['UPLOAD_FOLDER'])
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    
+    try:
         # Get original dimensions
         original_img = cv2.imread(input_path)
+        if original_img is None:
+            raise ValueError("Failed to load image")
         orig_h, orig_w = original_img.shape[:2]
+        del original_img
         
         # Process based on mode
         if upscale_mode == 'factor':
-            # Scale factor mode
-            try:
-                scale_factor = int(request.form.get('scale_factor', 2))
-                if scale_factor not in SCALE_FACTORS:
-                    return jsonify({'error': f'Invalid scale factor. Must be one of: {SCALE_FACTORS}'}), 400
-            except ValueError:
-                return jsonify({'error': 'Invalid scale factor'}), 400
-            
-            # Upscale image
+            scale_factor = params['scale_factor']
             output_img = upscale_with_factor(input_path, scale_factor, config)
-            output_filename = f"upscaled_{scale_factor}x_{filename}"
-            
-        elif upscale_mode == 'resolution':
-            # Target resolution mode
-            try:
-                target_width = int(request.form.get('target_width'))
-                target_height = int(request.form.get('target_height'))
-                
-                if target_width <= 0 or target_height <= 0:
-                    return jsonify({'error': 'Invalid target resolution'}), 400
-                
-                if target_width > 20000 or target_height > 20000:
-                    return jsonify({'error': 'Target resolution too large (max 20000px)'}), 400
-                    
-            except (ValueError, TypeError):
-                return jsonify({'error': 'Invalid target resolution'}), 400
-            
-            # Upscale to target resolution
-            output_img = upscale_to_resolution(input_path, target_width, target_height, config)
-            output_filename = f"upscaled_{target_width}x{target_height}_{filename}"
-            
+            output_filename = f"upscaled_{scale_factor}x_{key[:8]}_{filename}"
         else:
-            return jsonify({'error': 'Invalid upscale mode'}), 400
+            target_width = params['target_width']
+            target_height = params['target_height']
+            output_img = upscale_to_resolution(input_path, target_width, target_height, config)
+            output_filename = f"upscaled_{target_width}x{target_height}_{key[:8]}_{filename}"
         
-        # Save output
+        # Save output in the background; callers wait for it or not (pyramid)
         os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
         output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-        cv2.imwrite(output_path, output_img)
+        output = {'image': output_img, 'error': None}
+        output['writer'] = Thread(target=write_output, args=(output, output_path), daemon=True)
+        output['writer'].start()
         
         final_h, final_w = output_img.shape[:2]
         
+    finally:
         # Clean up input file
         os.remove(input_path)
-        
-        return jsonify({
-            'success': True,
-            'output_file': output_filename,
-            'message': f'Image upscaled successfully',
-            'original_size': f'{orig_w}x{orig_h}',
-            'upscaled_size': f'{final_w}x{final_h}'
-        })
-        
+    
+    return {
+        'success': True,
+        'output_file': output_filename,
+        'message': f'Image upscaled successfully',
+        'original_size': f'{orig_w}x{orig_h}',
+        'upscaled_size': f'{final_w}x{final_h}',
+        '_output': output
+    }
+
+def write_output(output, output_path):
+    """Encode an output image (writer thread)
+    
+    The image is written to a temporary file and renamed into place, so the
+    output only becomes downloadable once complete and concurrent writers
+    of the same output never interleave. Failures are stored in output['error'].
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=f"_{os.path.basename(output_path)}",
+                                    dir=os.path.dirname(output_path))
+    os.close(fd)
+    try:
+        if not cv2.imwrite(tmp_path, output['image']):
+            raise IOError(f"Failed to write {os.path.basename(output_path)}")
+        os.replace(tmp_path, output_path)
     except Exception as e:
-        print(f"ERROR processing image: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': str(e)}), 500
+        print(f"ERROR writing output: {e}")
+        output['error'] = e
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def ensure_pyramid(img, pyramid_id):
+    """Build the pyramid of an output unless an earlier request already did"""
+    pyramid_dir = os.path.join(PYRAMID_FOLDER, pyramid_id)
+    if not os.path.isdir(pyramid_dir):
+        build_pyramid(img, pyramid_dir)
 
 @app.route('/api/download/<filename>')
 def download(filename):
@@ -380,6 +1311,12 @@ def download(filename):
     except Exception as e:
         return jsonify({'error': str(e)}), 404
 
+@app.route('/api/pyramid/<pyramid_id>/<path:path>')
+def pyramid(pyramid_id, path):
+    """Serve the .dzi descriptor or a tile of a deep-zoom pyramid"""
+    pyramid_dir = os.path.join(PYRAMID_FOLDER, secure_filename(pyramid_id))
+    return send_from_directory(os.path.abspath(pyramid_dir), path, max_age=PYRAMID_CACHE_MAX_AGE)
+
 def open_browser():
     """Open web browser after a short delay"""
     webbrowser.open('http://localhost:5000')
@@ -388,6 +1325,9 @@ if __name__ == '__main__':
     # Create necessary directories
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    os.makedirs(SCRATCH_FOLDER, exist_ok=True)
+    cleanup_scratch()
+    cleanup_uploads()
     
     # Load and verify configuration
     config = load_models_config()
@@ -399,8 +1339,7 @@ if __name__ == '__main__':
     print("\n" + "="*60)
     print("AI Image Upscaler - Offline & Private")
     print("="*60)
-    print(f"\nDevice: {'CUDA (GPU)' if torch.cuda.is_available() else 'CPU'}")
-    print(f"Models path: {config['models_path']}")
+    print(f"\nModels path: {config['models_path']}")
     print(f"\nUpscaling method: Realistic (High Quality)")
     print("\n" + "="*60)
     print("\nStarting server on http://localhost:5000")
@@ -408,8 +1347,11 @@ if __name__ == '__main__':
     print("\nPress Ctrl+C to stop the server")
     print("="*60 + "\n")
     
+    # Import the ML stack and load the default model while the server starts
+    Thread(target=warm_up, name='warm-up', daemon=True).start()
+    
     # Open browser after 1.5 seconds
     Timer(1.5, open_browser).start()
     
     # Start Flask server
-    app.run(host='localhost', port=5000, debug=False)
+    app.run(host='localhost', port=5000, debug=False, threaded=True)
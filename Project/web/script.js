@@ -6,6 +6,25 @@ let targetWidth = null;
 let targetHeight = null;
 let scaleFactors = [];
 
+// Chunked upload settings
+const UPLOAD_RETRIES = 3;
+
+// Polling for full-size outputs still being written (deep-zoom mode)
+const OUTPUT_POLL_INTERVAL = 1000;
+const OUTPUT_POLL_LIMIT = 600;
+let outputPoll = null;
+
+// Deep-zoom viewer state
+const viewer = {
+    info: null,         // Pyramid descriptor from the .dzi file
+    zoom: 1,            // Screen pixels per full-resolution image pixel
+    x: 0,               // Screen position of the image's top-left corner
+    y: 0,
+    tiles: new Map(),   // Loaded tile images by "level/col_row"
+    drag: null,
+    frame: null
+};
+
 // DOM elements
 const uploadArea = document.getElementById('uploadArea');
 const fileInput = document.getElementById('fileInput');
@@ -29,6 +48,10 @@ const resultImage = document.getElementById('resultImage');
 const downloadBtn = document.getElementById('downloadBtn');
 const newUpscaleBtn = document.getElementById('newUpscaleBtn');
 const statusMessage = document.getElementById('statusMessage');
+const optimizeInput = document.getElementById('optimizeInput');
+const pyramidInput = document.getElementById('pyramidInput');
+const zoomViewer = document.getElementById('zoomViewer');
+const viewerCanvas = document.getElementById('viewerCanvas');
 
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
@@ -130,6 +153,19 @@ function setupEventListeners() {
     
     // New upscale button
     newUpscaleBtn.addEventListener('click', resetAll);
+    
+    // Deep-zoom viewer
+    viewerCanvas.addEventListener('wheel', handleViewerWheel, { passive: false });
+    viewerCanvas.addEventListener('pointerdown', handleViewerPointerDown);
+    viewerCanvas.addEventListener('pointermove', handleViewerPointerMove);
+    viewerCanvas.addEventListener('pointerup', handleViewerPointerUp);
+    viewerCanvas.addEventListener('pointercancel', handleViewerPointerUp);
+    viewerCanvas.addEventListener('dblclick', fitViewer);
+    window.addEventListener('resize', () => {
+        if (viewer.info) {
+            resizeViewer();
+        }
+    });
 }
 
 // Handle file selection
@@ -276,30 +312,33 @@ async function handleUpscale() {
     showStatus(statusMsg, 'info');
     
     try {
-        // Create form data
-        const formData = new FormData();
-        formData.append('file', selectedFile);
-        formData.append('mode', selectedMode);
+        // Shrink / re-encode the image and upload it in resumable chunks
+        const uploadFile = await prepareUpload(selectedFile);
+        let uploadId = await uploadFileChunked(uploadFile);
         
-        if (selectedMode === 'factor') {
-            formData.append('scale_factor', selectedScaleFactor);
-        } else {
-            formData.append('target_width', targetWidth);
-            formData.append('target_height', targetHeight);
-        }
+        showStatus(statusMsg, 'info');
+        let response = await requestUpscale(uploadFile, uploadId);
         
-        // Upload and process
-        const response = await fetch('/api/upscale', {
-            method: 'POST',
-            body: formData
-        });
+        // Uploads expire on the server; resend if this one is gone
+        if (uploadId && response.status === 400) {
+            const error = await response.clone().json();
+            if (error.error === 'Unknown upload') {
+                uploadId = await uploadFileChunked(uploadFile);
+                showStatus(statusMsg, 'info');
+                response = await requestUpscale(uploadFile, uploadId);
+            }
+        }
         
         const data = await response.json();
         
         if (response.ok && data.success) {
             // Show result
             showResult(data.output_file, data);
-            showStatus(data.message + ` (${data.original_size} → ${data.upscaled_size})`, 'success');
+            // The server may have received a pre-shrunk copy; report the picked file
+            const originalSize = imagePreview.naturalWidth
+                ? `${imagePreview.naturalWidth}x${imagePreview.naturalHeight}`
+                : data.original_size;
+            showStatus(data.message + ` (${originalSize} → ${data.upscaled_size})`, 'success');
         } else {
             throw new Error(data.error || 'Upscaling failed');
         }
@@ -311,6 +350,151 @@ async function handleUpscale() {
     }
 }
 
+// Send the upscale request for an uploaded file
+function requestUpscale(uploadFile, uploadId) {
+    const formData = new FormData();
+    if (uploadId) {
+        formData.append('upload_id', uploadId);
+        formData.append('filename', uploadFile.name);
+    } else {
+        formData.append('file', uploadFile);
+    }
+    formData.append('mode', selectedMode);
+    
+    if (selectedMode === 'factor') {
+        formData.append('scale_factor', selectedScaleFactor);
+    } else {
+        formData.append('target_width', targetWidth);
+        formData.append('target_height', targetHeight);
+    }
+    
+    if (pyramidInput.checked) {
+        formData.append('pyramid', '1');
+    }
+    
+    return fetch('/api/upscale', {
+        method: 'POST',
+        body: formData
+    });
+}
+
+// Downscale inputs larger than the target needs and re-encode BMPs
+async function prepareUpload(file) {
+    if (!optimizeInput.checked) {
+        return file;
+    }
+    
+    // Optimizing is best effort; the original always uploads fine
+    try {
+        return await optimizeImage(file);
+    } catch (error) {
+        console.warn('Skipping pre-upload optimization:', error);
+        return file;
+    }
+}
+
+// Shrink / re-encode an image in the browser, returns the original if that doesn't help
+async function optimizeImage(file) {
+    const isBmp = file.type === 'image/bmp';
+    const bitmap = await createImageBitmap(file);
+    
+    // The backend upscales at least 2x, so in resolution mode anything larger
+    // than half the target is wasted work and upload time
+    let scale = 1;
+    if (selectedMode === 'resolution') {
+        scale = Math.min(1, Math.max(targetWidth / bitmap.width, targetHeight / bitmap.height) / 2);
+    }
+    
+    if (scale === 1 && !isBmp) {
+        bitmap.close();
+        return file;
+    }
+    
+    showStatus('Preparing image...', 'info');
+    
+    const canvas = document.createElement('canvas');
+    canvas.width = Math.ceil(bitmap.width * scale);
+    canvas.height = Math.ceil(bitmap.height * scale);
+    const ctx = canvas.getContext('2d');
+    ctx.imageSmoothingQuality = 'high';
+    ctx.drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+    bitmap.close();
+    
+    // Lossy inputs stay lossy, everything else becomes PNG
+    const type = (file.type === 'image/jpeg' || file.type === 'image/webp') ? file.type : 'image/png';
+    const blob = await new Promise(resolve => canvas.toBlob(resolve, type, 0.95));
+    
+    if (!blob || (scale === 1 && blob.size >= file.size)) {
+        return file;
+    }
+    
+    const name = type === 'image/png' ? file.name.replace(/\.[^.]+$/, '') + '.png' : file.name;
+    return new File([blob], name, { type });
+}
+
+// Upload a file in resumable chunks, returns the upload id (null if unsupported)
+async function uploadFileChunked(file) {
+    // SHA-256 needs a secure context; localhost qualifies
+    if (!(window.crypto && crypto.subtle)) {
+        return null;
+    }
+    
+    // The upload id is the file's SHA-256, so retries resume the same upload
+    const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    const uploadId = Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    
+    for (let attempt = 0; ; attempt++) {
+        try {
+            await sendChunks(uploadId, file);
+            return uploadId;
+        } catch (error) {
+            if (error.permanent || attempt >= UPLOAD_RETRIES) {
+                throw error;
+            }
+            showStatus(`Upload interrupted, retrying (${attempt + 1}/${UPLOAD_RETRIES})...`, 'info');
+            await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+        }
+    }
+}
+
+// Start (or resume) an upload and send the chunks the server is missing
+async function sendChunks(uploadId, file) {
+    const response = await fetch('/api/upload', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ upload_id: uploadId, filename: file.name, size: file.size })
+    });
+    const session = await response.json();
+    
+    if (!response.ok) {
+        const error = new Error(session.error || 'Upload failed');
+        error.permanent = response.status === 400;
+        throw error;
+    }
+    
+    const received = new Set(session.received);
+    
+    for (let index = 0; index < session.chunks; index++) {
+        if (received.has(index)) {
+            continue;
+        }
+        
+        const chunk = file.slice(index * session.chunk_size, (index + 1) * session.chunk_size);
+        const chunkResponse = await fetch(`/api/upload/${uploadId}/${index}`, {
+            method: 'PUT',
+            body: chunk
+        });
+        
+        if (!chunkResponse.ok) {
+            const data = await chunkResponse.json().catch(() => ({}));
+            throw new Error(data.error || 'Chunk upload failed');
+        }
+        
+        received.add(index);
+        showStatus(`Uploading... ${Math.round(received.size * 100 / session.chunks)}%`, 'info');
+    }
+}
+
 // Show result
 function showResult(filename, data) {
     // Hide upload and processing sections
@@ -320,10 +504,28 @@ function showResult(filename, data) {
     resolutionSection.style.display = 'none';
     actionSection.style.display = 'none';
     
-    // Show result
-    resultImage.src = '/api/download/' + filename;
+    // Show result; with a pyramid only the visible tiles are fetched
     resultImage.dataset.filename = filename;
     resultSection.style.display = 'block';
+    if (data.pyramid) {
+        resultImage.style.display = 'none';
+        zoomViewer.style.display = 'block';
+        openViewer(data.pyramid).catch(error => {
+            showStatus('Error loading deep-zoom preview: ' + error.message, 'error');
+        });
+    } else {
+        resultImage.src = '/api/download/' + filename;
+        resultImage.style.display = 'block';
+        zoomViewer.style.display = 'none';
+    }
+    
+    // The full file may still be encoding while the pyramid is viewable
+    if (data.output_ready === false) {
+        downloadBtn.style.display = 'none';
+        waitForOutput(filename);
+    } else {
+        downloadBtn.style.display = '';
+    }
     
     // Reset button
     btnText.style.display = 'inline';
@@ -331,6 +533,197 @@ function showResult(filename, data) {
     upscaleBtn.disabled = false;
 }
 
+// Show the download button once the full-size output exists
+function waitForOutput(filename, attempt = 0) {
+    outputPoll = setTimeout(async () => {
+        try {
+            const response = await fetch('/api/download/' + filename, { method: 'HEAD' });
+            if (response.ok) {
+                outputPoll = null;
+                downloadBtn.style.display = '';
+                return;
+            }
+        } catch (error) {
+            // Server busy or briefly unreachable; keep polling
+        }
+        
+        if (attempt + 1 < OUTPUT_POLL_LIMIT) {
+            waitForOutput(filename, attempt + 1);
+        } else {
+            outputPoll = null;
+            showStatus('The full-size image could not be prepared for download.', 'error');
+        }
+    }, OUTPUT_POLL_INTERVAL);
+}
+
+// Load a pyramid descriptor and show it in the viewer
+async function openViewer(pyramidId) {
+    const response = await fetch(`/api/pyramid/${pyramidId}/image.dzi`);
+    if (!response.ok) {
+        throw new Error('Pyramid not found');
+    }
+    
+    const xml = new DOMParser().parseFromString(await response.text(), 'application/xml');
+    const image = xml.documentElement;
+    const size = image.getElementsByTagName('Size')[0];
+    const width = parseInt(size.getAttribute('Width'));
+    const height = parseInt(size.getAttribute('Height'));
+    
+    viewer.info = {
+        base: `/api/pyramid/${pyramidId}/image_files`,
+        width,
+        height,
+        tileSize: parseInt(image.getAttribute('TileSize')),
+        format: image.getAttribute('Format'),
+        maxLevel: Math.ceil(Math.log2(Math.max(width, height)))
+    };
+    viewer.tiles.clear();
+    
+    resizeViewer();
+    fitViewer();
+}
+
+// Close the viewer and drop its tiles
+function closeViewer() {
+    viewer.info = null;
+    viewer.tiles.clear();
+    zoomViewer.style.display = 'none';
+}
+
+// Match the canvas resolution to its displayed size
+function resizeViewer() {
+    viewerCanvas.width = viewerCanvas.clientWidth;
+    viewerCanvas.height = viewerCanvas.clientHeight;
+    requestViewerDraw();
+}
+
+// Fit the whole image into the viewer
+function fitViewer() {
+    const { info } = viewer;
+    if (!info) {
+        return;
+    }
+    viewer.zoom = Math.min(viewerCanvas.width / info.width, viewerCanvas.height / info.height);
+    viewer.x = (viewerCanvas.width - info.width * viewer.zoom) / 2;
+    viewer.y = (viewerCanvas.height - info.height * viewer.zoom) / 2;
+    requestViewerDraw();
+}
+
+// Schedule a redraw on the next animation frame
+function requestViewerDraw() {
+    if (!viewer.frame) {
+        viewer.frame = requestAnimationFrame(() => {
+            viewer.frame = null;
+            drawViewer();
+        });
+    }
+}
+
+// Draw the visible tiles of the best level for the current zoom
+function drawViewer() {
+    const { info } = viewer;
+    if (!info) {
+        return;
+    }
+    
+    const ctx = viewerCanvas.getContext('2d');
+    ctx.clearRect(0, 0, viewerCanvas.width, viewerCanvas.height);
+    
+    // A single-tile overview goes underneath while detail tiles load
+    const overview = Math.min(info.maxLevel, Math.floor(Math.log2(info.tileSize)));
+    const level = Math.max(overview, Math.min(info.maxLevel, info.maxLevel + Math.ceil(Math.log2(viewer.zoom))));
+    
+    drawViewerLevel(ctx, overview);
+    if (level !== overview) {
+        drawViewerLevel(ctx, level);
+    }
+}
+
+// Draw the visible tiles of one pyramid level
+function drawViewerLevel(ctx, level) {
+    const { info } = viewer;
+    const levelScale = 2 ** (level - info.maxLevel);
+    const levelWidth = Math.ceil(info.width * levelScale);
+    const levelHeight = Math.ceil(info.height * levelScale);
+    const drawScale = viewer.zoom / levelScale;
+    const span = info.tileSize * drawScale;
+    
+    const firstCol = Math.max(0, Math.floor(-viewer.x / span));
+    const lastCol = Math.min(Math.ceil(levelWidth / info.tileSize), Math.ceil((viewerCanvas.width - viewer.x) / span));
+    const firstRow = Math.max(0, Math.floor(-viewer.y / span));
+    const lastRow = Math.min(Math.ceil(levelHeight / info.tileSize), Math.ceil((viewerCanvas.height - viewer.y) / span));
+    
+    for (let row = firstRow; row < lastRow; row++) {
+        for (let col = firstCol; col < lastCol; col++) {
+            const tile = getViewerTile(level, col, row);
+            if (tile.complete && tile.naturalWidth) {
+                ctx.drawImage(
+                    tile,
+                    viewer.x + col * span,
+                    viewer.y + row * span,
+                    tile.naturalWidth * drawScale,
+                    tile.naturalHeight * drawScale
+                );
+            }
+        }
+    }
+}
+
+// Get a tile image, starting its download on first use
+function getViewerTile(level, col, row) {
+    const key = `${level}/${col}_${row}`;
+    let tile = viewer.tiles.get(key);
+    
+    if (!tile) {
+        tile = new Image();
+        tile.onload = requestViewerDraw;
+        tile.src = `${viewer.info.base}/${key}.${viewer.info.format}`;
+        viewer.tiles.set(key, tile);
+    }
+    
+    return tile;
+}
+
+// Zoom around the cursor
+function handleViewerWheel(e) {
+    if (!viewer.info) {
+        return;
+    }
+    e.preventDefault();
+    
+    const fitZoom = Math.min(viewerCanvas.width / viewer.info.width, viewerCanvas.height / viewer.info.height);
+    const zoom = Math.min(4, Math.max(fitZoom / 2, viewer.zoom * Math.exp(-e.deltaY * 0.0015)));
+    const factor = zoom / viewer.zoom;
+    
+    viewer.x = e.offsetX - (e.offsetX - viewer.x) * factor;
+    viewer.y = e.offsetY - (e.offsetY - viewer.y) * factor;
+    viewer.zoom = zoom;
+    requestViewerDraw();
+}
+
+// Pan by dragging
+function handleViewerPointerDown(e) {
+    viewer.drag = { x: e.clientX, y: e.clientY };
+    viewerCanvas.setPointerCapture(e.pointerId);
+    viewerCanvas.classList.add('dragging');
+}
+
+function handleViewerPointerMove(e) {
+    if (!viewer.drag) {
+        return;
+    }
+    
+    viewer.x += e.clientX - viewer.drag.x;
+    viewer.y += e.clientY - viewer.drag.y;
+    viewer.drag = { x: e.clientX, y: e.clientY };
+    requestViewerDraw();
+}
+
+function handleViewerPointerUp() {
+    viewer.drag = null;
+    viewerCanvas.classList.remove('dragging');
+}
+
 // Handle download
 function handleDownload() {
     const filename = resultImage.dataset.filename;
@@ -376,6 +769,9 @@ function resetAll() {
     resolutionSection.style.display = 'none';
     actionSection.style.display = 'none';
     resultSection.style.display = 'none';
+    closeViewer();
+    clearTimeout(outputPoll);
+    outputPoll = null;
     
     // Clear selections
     modeFactorCard.classList.add('selected');